@@ -11,6 +11,13 @@ from dotenv import load_dotenv
 
 import db as vote_db
 
+try:
+    import uvloop
+except ImportError:  # Not available on Windows.
+    uvloop = None
+
+load_dotenv()
+
 
 def _env_int(name: str) -> Optional[int]:
     raw = os.getenv(name, "").strip()
@@ -19,40 +26,47 @@ def _env_int(name: str) -> Optional[int]:
     return int(raw)
 
 
-def _db_path() -> str:
-    return os.getenv("DB_PATH", "votes.db").strip() or "votes.db"
+# Resolved once at import; the environment does not change while running.
+DB_PATH = os.getenv("DB_PATH", "votes.db").strip() or "votes.db"
+GUILD_ID = _env_int("GUILD_ID")
+GUILD_OBJECT = discord.Object(id=GUILD_ID) if GUILD_ID is not None else None
 
 
-def _format_standings(rows: list[vote_db.VoteStandingRow], total: int) -> str:
+def _format_standings(rows: list[vote_db.VoteStandingRow]) -> str:
     if not rows:
         return "No vote options have been set yet. Use `/setvote` first."
-    lines = [f"{r.option_id}. {r.label} — {r.votes}" for r in rows]
-    lines.append("")
-    lines.append(f"Total votes: {total}")
-    return "\n".join(lines)
+    total = sum(r.votes for r in rows)
+    body = "\n".join(f"{r.option_id}. {r.label} — {r.votes}" for r in rows)
+    return f"{body}\n\nTotal votes: {total}"
 
 
 intents = discord.Intents.default()
 bot = commands.Bot(command_prefix="!", intents=intents)
 
 
+# on_ready fires again after every reconnect; only sync commands the first time.
+_synced = False
+
+
 @bot.event
 async def on_ready() -> None:
-    # Initialize DB on startup (idempotent).
-    await vote_db.init_db(_db_path())
-
-    guild_id = _env_int("GUILD_ID")
-    if guild_id is not None:
-        guild = discord.Object(id=guild_id)
-        bot.tree.copy_global_to(guild=guild)
-        await bot.tree.sync(guild=guild)
-        print(f"Synced commands to guild {guild_id}. Logged in as {bot.user}.")
+    global _synced
+    if _synced:
+        return
+
+    if GUILD_OBJECT is not None:
+        bot.tree.copy_global_to(guild=GUILD_OBJECT)
+        await bot.tree.sync(guild=GUILD_OBJECT)
+        print(f"Synced commands to guild {GUILD_ID}. Logged in as {bot.user}.")
     else:
         await bot.tree.sync()
         print(f"Synced global commands. Logged in as {bot.user}.")
+    _synced = True
 
 
 @bot.tree.command(name="setvote", description="Set vote options (admin only). Resets existing votes.")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
 @app_commands.checks.has_permissions(administrator=True)
 @app_commands.describe(
     option1="First option (required)",
@@ -85,13 +99,12 @@ async def setvote(
             labels.append(opt)
 
     try:
-        count = await vote_db.set_vote_options(_db_path(), labels)
+        count = await vote_db.set_vote_options(DB_PATH, labels)
     except ValueError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
 
-    options = await vote_db.list_vote_options(_db_path())
-    rendered = "\n".join([f"{i}. {label}" for i, label in options])
+    rendered = await vote_db.get_options_rendered(DB_PATH)
     await interaction.response.send_message(
         f"Vote options set ({count}). Existing votes were cleared.\n\n{rendered}",
         ephemeral=True,
@@ -101,83 +114,73 @@ async def setvote(
 @bot.tree.command(name="vote", description="Cast your vote (one-time).")
 @app_commands.describe(choice="The number corresponding to the option set by /setvote")
 async def vote(interaction: discord.Interaction, choice: int) -> None:
-    await vote_db.init_db(_db_path())
-
-    user_id = interaction.user.id
-    if await vote_db.user_has_voted(_db_path(), user_id):
-        await interaction.response.send_message("User has already voted")
-        return
-
-    if not await vote_db.option_exists(_db_path(), choice):
-        opts = await vote_db.list_vote_options(_db_path())
-        if not opts:
+    try:
+        recorded = await vote_db.cast_vote(DB_PATH, interaction.user.id, choice)
+    except vote_db.InvalidOptionError:
+        rendered = await vote_db.get_options_rendered(DB_PATH)
+        if not rendered:
             await interaction.response.send_message(
                 "No vote options have been set yet. An admin must run `/setvote` first.",
                 ephemeral=True,
             )
             return
-        rendered = "\n".join([f"{i}. {label}" for i, label in opts])
         await interaction.response.send_message(
             f"Invalid choice. Please vote using one of these numbers:\n\n{rendered}",
             ephemeral=True,
         )
         return
-
-    try:
-        await vote_db.cast_vote(_db_path(), user_id, choice)
     except Exception:
-        # Covers rare race conditions (double-submit) or db errors.
-        if await vote_db.user_has_voted(_db_path(), user_id):
-            await interaction.response.send_message("User has already voted")
-        else:
-            await interaction.response.send_message(
-                "Sorry, something went wrong recording your vote.",
-                ephemeral=True,
-            )
+        await interaction.response.send_message(
+            "Sorry, something went wrong recording your vote.",
+            ephemeral=True,
+        )
+        return
+
+    if not recorded:
+        await interaction.response.send_message("User has already voted")
         return
 
     await interaction.response.send_message("Thank you for voting")
 
 
 @bot.tree.command(name="clearvotes", description="Clear all current votes (admin only).")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
 @app_commands.checks.has_permissions(administrator=True)
 async def clearvotes(interaction: discord.Interaction) -> None:
-    await vote_db.init_db(_db_path())
-    await vote_db.clear_votes(_db_path())
+    await vote_db.clear_votes(DB_PATH)
     await interaction.response.send_message("Votes cleared. (Vote options were kept.)", ephemeral=True)
 
 
 @bot.tree.command(name="checkvote", description="Check current standings (admin only, ephemeral).")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
 @app_commands.checks.has_permissions(administrator=True)
 async def checkvote(interaction: discord.Interaction) -> None:
-    await vote_db.init_db(_db_path())
-    rows = await vote_db.get_vote_standings(_db_path())
-    total = await vote_db.get_total_votes(_db_path())
-    msg = _format_standings(rows, total)
+    rows = await vote_db.get_vote_standings(DB_PATH)
+    msg = _format_standings(rows)
     await interaction.response.send_message(msg, ephemeral=True)
 
 
 @bot.tree.command(name="publishvote", description="Publish final vote results (admin only).")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
 @app_commands.checks.has_permissions(administrator=True)
 async def publishvote(interaction: discord.Interaction) -> None:
-    await vote_db.init_db(_db_path())
-    rows = await vote_db.get_vote_standings(_db_path())
-    total = await vote_db.get_total_votes(_db_path())
-    msg = _format_standings(rows, total)
+    rows = await vote_db.get_vote_standings(DB_PATH)
+    msg = _format_standings(rows)
     await interaction.response.send_message(msg, ephemeral=False)
 
 
 @bot.tree.command(name="showpoll", description="Show the available vote options.")
 async def showpoll(interaction: discord.Interaction) -> None:
-    await vote_db.init_db(_db_path())
-    options = await vote_db.list_vote_options(_db_path())
-    if not options:
+    rendered = await vote_db.get_options_rendered(DB_PATH)
+    if not rendered:
         await interaction.response.send_message(
             "No vote options have been set yet. An admin must run `/setvote` first."
         )
         return
 
-    rendered = "\n".join([f"{i}. {label}" for i, label in options])
     await interaction.response.send_message(f"Vote options:\n\n{rendered}", ephemeral=False)
 
 
@@ -204,20 +207,25 @@ async def on_app_command_error(
 
 
 async def main() -> None:
-    load_dotenv()
     token = os.getenv("DISCORD_TOKEN", "").strip()
     if not token:
         raise RuntimeError(
             "Missing DISCORD_TOKEN. Create a .env file (see example.env) and set DISCORD_TOKEN."
         )
 
-    await vote_db.init_db(_db_path())
+    await vote_db.init_db(DB_PATH)
 
-    async with bot:
-        await bot.start(token)
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        await vote_db.close_db()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
 
 
@@ -0,0 +1 @@
+# Lets a bare `pytest` run from the repo root import the top-level modules.
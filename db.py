@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+import sqlite3
+from collections import Counter
 from dataclasses import dataclass
 from typing import Iterable, Optional
 
@@ -13,9 +16,11 @@ class VoteStandingRow:
     votes: int
 
 
-SCHEMA_SQL = """
-PRAGMA foreign_keys = ON;
+class InvalidOptionError(ValueError):
+    """The chosen option_id does not exist."""
+
 
+SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS vote_options (
   option_id INTEGER PRIMARY KEY,
   label TEXT NOT NULL
@@ -24,123 +29,384 @@ CREATE TABLE IF NOT EXISTS vote_options (
 CREATE TABLE IF NOT EXISTS votes (
   user_id INTEGER PRIMARY KEY,
   option_id INTEGER NOT NULL,
-  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
   FOREIGN KEY(option_id) REFERENCES vote_options(option_id)
 );
 """
 
+# Per-connection tuning: WAL with synchronous=NORMAL avoids an fsync per commit.
+PRAGMA_SQL = """
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -64000;
+PRAGMA mmap_size = 134217728;
+PRAGMA busy_timeout = 5000;
+"""
+
+# Statement text lives in module constants so every call hands sqlite3 the
+# identical string and hits its per-connection prepared-statement cache.
+SQL_FOREIGN_KEYS_ON = "PRAGMA foreign_keys = ON;"
+SQL_JOURNAL_MODE_WAL = "PRAGMA journal_mode = WAL;"
+SQL_BEGIN_IMMEDIATE = "BEGIN IMMEDIATE;"
+SQL_DELETE_VOTES = "DELETE FROM votes;"
+SQL_DELETE_OPTIONS = "DELETE FROM vote_options;"
+SQL_INSERT_OPTION = "INSERT INTO vote_options(option_id, label) VALUES(?, ?);"
+SQL_LIST_OPTIONS = "SELECT option_id, label FROM vote_options ORDER BY option_id ASC;"
+SQL_LIST_VOTERS = "SELECT user_id FROM votes;"
+SQL_TALLY = "SELECT option_id, COUNT(*) FROM votes GROUP BY option_id;"
+SQL_INSERT_VOTE_PLAIN = "INSERT INTO votes(user_id, option_id) VALUES(?, ?);"
+# A duplicate user_id is skipped rather than raised; RETURNING reports whether
+# the row actually went in (needs SQLite >= 3.35).
+SQL_INSERT_VOTE = (
+    "INSERT INTO votes(user_id, option_id) VALUES(?, ?) "
+    "ON CONFLICT(user_id) DO NOTHING RETURNING user_id;"
+)
+
+# Single long-lived connection shared by every query; opened on first use.
+_conn: Optional[aiosqlite.Connection] = None
+_initialized = False
+
+# Write-through caches of vote_options, voter ids and per-option vote counts.
+# The bot is a single process, so these stay in step with the DB, which
+# remains authoritative.
+_options_cache: Optional[dict[int, str]] = None
+_options_rendered: Optional[str] = None  # "1. label" lines, built with the cache
+_voters_cache: Optional[set[int]] = None
+_tally: Optional[Counter[int]] = None
+
+# Writers share one connection, so their transactions (and the cache updates
+# that follow them) must not interleave. Created on first use so it belongs
+# to the running event loop, and dropped again by close_db().
+_write_lock: Optional[asyncio.Lock] = None
+
+# Group commit: concurrent votes queue up and one writer task commits them
+# together, so a burst of votes shares a single transaction and fsync.
+GROUP_COMMIT_WINDOW = 0.005  # seconds to wait for more votes to join a batch
+GROUP_COMMIT_MAX = 256
+# (user_id, option_id, future for the caller); None tells the writer to stop.
+_QueuedVote = tuple[int, int, asyncio.Future[bool]]
+_vote_queue: Optional[asyncio.Queue[Optional[_QueuedVote]]] = None
+_vote_writer: Optional[asyncio.Task[None]] = None
+
+
+async def get_conn(db_path: str) -> aiosqlite.Connection:
+    global _conn
+    if _conn is None:
+        _conn = await aiosqlite.connect(db_path)
+        _conn.row_factory = aiosqlite.Row
+        # Foreign key enforcement is per-connection; set it once here.
+        await _conn.execute(SQL_FOREIGN_KEYS_ON)
+        # journal_mode returns a row; fetch it so the mode change is applied.
+        async with _conn.execute(SQL_JOURNAL_MODE_WAL) as cur:
+            await cur.fetchone()
+        await _conn.executescript(PRAGMA_SQL)
+    return _conn
+
+
+async def close_db() -> None:
+    global _conn, _initialized, _write_lock, _vote_queue, _vote_writer
+    if _vote_writer is not None:
+        if not _vote_writer.done() and _vote_queue is not None:
+            # Let the writer commit every vote queued so far, then exit.
+            _vote_queue.put_nowait(None)
+            await _vote_writer
+        _vote_writer = None
+    if _vote_queue is not None:
+        # Only votes queued after the stop marker can be left over.
+        while not _vote_queue.empty():
+            item = _vote_queue.get_nowait()
+            if item is not None:
+                item[2].cancel()
+        _vote_queue = None
+    _write_lock = None
+    _invalidate_caches()
+    if _conn is not None:
+        await _conn.close()
+        _conn = None
+    _initialized = False
+
+
+def _get_write_lock() -> asyncio.Lock:
+    global _write_lock
+    if _write_lock is None:
+        _write_lock = asyncio.Lock()
+    return _write_lock
+
+
+def _invalidate_caches() -> None:
+    global _options_cache, _options_rendered, _voters_cache, _tally
+    _options_cache = None
+    _options_rendered = None
+    _voters_cache = None
+    _tally = None
+
+
+def _set_options(options: dict[int, str]) -> None:
+    global _options_cache, _options_rendered
+    _options_cache = options
+    _options_rendered = "\n".join(f"{i}. {label}" for i, label in sorted(options.items()))
+
+
+async def _load_caches(db: aiosqlite.Connection) -> None:
+    global _voters_cache, _tally
+    if _options_cache is None:
+        async with db.execute(SQL_LIST_OPTIONS) as cur:
+            rows = await cur.fetchall()
+        _set_options({int(r[0]): str(r[1]) for r in rows})
+    if _voters_cache is None:
+        async with db.execute(SQL_LIST_VOTERS) as cur:
+            rows = await cur.fetchall()
+        _voters_cache = {int(r[0]) for r in rows}
+    if _tally is None:
+        async with db.execute(SQL_TALLY) as cur:
+            rows = await cur.fetchall()
+        _tally = Counter({int(r[0]): int(r[1]) for r in rows})
+
+
+async def _options(db_path: str) -> dict[int, str]:
+    if _options_cache is None:
+        await _load_caches(await get_conn(db_path))
+    assert _options_cache is not None
+    return _options_cache
+
+
+async def _voters(db_path: str) -> set[int]:
+    if _voters_cache is None:
+        await _load_caches(await get_conn(db_path))
+    assert _voters_cache is not None
+    return _voters_cache
+
+
+async def _counts(db_path: str) -> Counter[int]:
+    if _tally is None:
+        await _load_caches(await get_conn(db_path))
+    assert _tally is not None
+    return _tally
+
 
 async def init_db(db_path: str) -> None:
-    async with aiosqlite.connect(db_path) as db:
-        await db.executescript(SCHEMA_SQL)
-        await db.commit()
+    global _initialized
+    if _initialized:
+        return
+    db = await get_conn(db_path)
+    await db.executescript(SCHEMA_SQL)
+    await db.commit()
+    await _load_caches(db)
+    _initialized = True
 
 
 async def set_vote_options(db_path: str, labels: Iterable[str]) -> int:
+    global _voters_cache, _tally
     labels_list = [l.strip() for l in labels if l and l.strip()]
     if len(labels_list) < 2:
         raise ValueError("At least 2 non-empty vote options are required.")
 
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("PRAGMA foreign_keys = ON;")
-        async with db.execute("BEGIN;"):
+    db = await get_conn(db_path)
+    async with _get_write_lock():
+        await db.execute(SQL_BEGIN_IMMEDIATE)
+        try:
             # Reset options and votes to avoid mismatched/invalid votes.
-            await db.execute("DELETE FROM votes;")
-            await db.execute("DELETE FROM vote_options;")
-
-            for idx, label in enumerate(labels_list, start=1):
-                await db.execute(
-                    "INSERT INTO vote_options(option_id, label) VALUES(?, ?);",
-                    (idx, label),
-                )
-
+            await db.execute(SQL_DELETE_VOTES)
+            await db.execute(SQL_DELETE_OPTIONS)
+            await db.executemany(SQL_INSERT_OPTION, list(enumerate(labels_list, start=1)))
+        except Exception:
+            await db.rollback()
+            _invalidate_caches()
+            raise
         await db.commit()
+
+        _set_options(dict(enumerate(labels_list, start=1)))
+        _voters_cache = set()
+        _tally = Counter()
     return len(labels_list)
 
 
 async def list_vote_options(db_path: str) -> list[tuple[int, str]]:
-    async with aiosqlite.connect(db_path) as db:
-        cur = await db.execute(
-            "SELECT option_id, label FROM vote_options ORDER BY option_id ASC;"
-        )
-        rows = await cur.fetchall()
-        return [(int(r[0]), str(r[1])) for r in rows]
+    return sorted((await _options(db_path)).items())
+
+
+async def get_options_rendered(db_path: str) -> str:
+    """Return the options as "1. label" lines, or "" if none are set."""
+    if _options_rendered is None:
+        await _load_caches(await get_conn(db_path))
+    assert _options_rendered is not None
+    return _options_rendered
 
 
 async def user_has_voted(db_path: str, user_id: int) -> bool:
-    async with aiosqlite.connect(db_path) as db:
-        cur = await db.execute("SELECT 1 FROM votes WHERE user_id = ?;", (user_id,))
-        row = await cur.fetchone()
-        return row is not None
+    return user_id in await _voters(db_path)
 
 
 async def option_exists(db_path: str, option_id: int) -> bool:
-    async with aiosqlite.connect(db_path) as db:
-        cur = await db.execute(
-            "SELECT 1 FROM vote_options WHERE option_id = ?;", (option_id,)
-        )
-        row = await cur.fetchone()
-        return row is not None
-
-
-async def cast_vote(db_path: str, user_id: int, option_id: int) -> None:
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("PRAGMA foreign_keys = ON;")
-        await db.execute(
-            "INSERT INTO votes(user_id, option_id) VALUES(?, ?);",
-            (user_id, option_id),
-        )
+    return option_id in await _options(db_path)
+
+
+async def cast_vote(db_path: str, user_id: int, option_id: int) -> bool:
+    """Record a vote; return False if the user had already voted.
+
+    The vote is handed to the group-commit writer and this call returns once
+    its batch has committed. The caches answer the common rejections up front
+    without touching the DB.
+    """
+    if user_id in await _voters(db_path):
+        return False
+    if option_id not in await _options(db_path):
+        raise InvalidOptionError(f"Unknown vote option: {option_id}")
+
+    fut: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+    _ensure_vote_writer(db_path).put_nowait((user_id, option_id, fut))
+    return await fut
+
+
+def _ensure_vote_writer(
+    db_path: str,
+) -> asyncio.Queue[Optional[_QueuedVote]]:
+    global _vote_queue, _vote_writer
+    if _vote_queue is None:
+        _vote_queue = asyncio.Queue()
+    if _vote_writer is None or _vote_writer.done():
+        _vote_writer = asyncio.create_task(_run_vote_writer(db_path, _vote_queue))
+    return _vote_queue
+
+
+async def _run_vote_writer(
+    db_path: str, queue: asyncio.Queue[Optional[_QueuedVote]]
+) -> None:
+    stopping = False
+    while not stopping:
+        item = await queue.get()
+        if item is None:
+            return
+        batch = [item]
+        try:
+            # Give concurrent voters a moment to join this batch.
+            await asyncio.sleep(GROUP_COMMIT_WINDOW)
+            while len(batch) < GROUP_COMMIT_MAX and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    # Commit what we hold, then stop.
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await _commit_votes(db_path, batch)
+        except asyncio.CancelledError:
+            for _, _, fut in batch:
+                fut.cancel()
+            raise
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+
+async def _commit_votes(
+    db_path: str, batch: list[_QueuedVote]
+) -> None:
+    db = await get_conn(db_path)
+    async with _get_write_lock():
+        voters = await _voters(db_path)
+        options = await _options(db_path)
+        tally = await _counts(db_path)
+
+        # Re-check under the lock: options may have been reset, and the same
+        # user may appear twice in one batch.
+        accepted: list[_QueuedVote] = []
+        batch_users: set[int] = set()
+        for user_id, option_id, fut in batch:
+            if fut.done():  # Caller was cancelled.
+                continue
+            if user_id in voters or user_id in batch_users:
+                fut.set_result(False)
+            elif option_id not in options:
+                fut.set_exception(InvalidOptionError(f"Unknown vote option: {option_id}"))
+            else:
+                accepted.append((user_id, option_id, fut))
+                batch_users.add(user_id)
+        if not accepted:
+            return
+
+        # The re-check above rules out conflicts, so every accepted row goes in.
+        await db.execute(SQL_BEGIN_IMMEDIATE)
+        try:
+            await db.executemany(SQL_INSERT_VOTE_PLAIN, [(u, o) for u, o, _ in accepted])
+        except aiosqlite.IntegrityError:
+            # The DB disagrees with the caches (a vote or option changed behind
+            # their back); retry row by row so each vote gets its own answer,
+            # then reload the caches from the DB on next use.
+            await db.rollback()
+            try:
+                for user_id, option_id, fut in accepted:
+                    if fut.done():  # Caller was cancelled.
+                        continue
+                    try:
+                        ok = await _insert_vote(db, user_id, option_id)
+                    except Exception as e:
+                        if not fut.done():
+                            fut.set_exception(e)
+                        continue
+                    if not fut.done():
+                        fut.set_result(ok)
+            finally:
+                _invalidate_caches()
+            return
+        except Exception:
+            await db.rollback()
+            raise
         await db.commit()
 
+        for user_id, option_id, fut in accepted:
+            voters.add(user_id)
+            tally[option_id] += 1
+            if not fut.done():
+                fut.set_result(True)
+
+
+async def _insert_vote(db: aiosqlite.Connection, user_id: int, option_id: int) -> bool:
+    """Insert and commit one vote; return False if the user had already voted.
+
+    The option_id foreign key rejects unknown options.
+    """
+    try:
+        async with db.execute(SQL_INSERT_VOTE, (user_id, option_id)) as cur:
+            row = await cur.fetchone()
+    except aiosqlite.IntegrityError as e:
+        # Leave the shared connection clean for the next caller.
+        await db.rollback()
+        if getattr(e, "sqlite_errorcode", None) == sqlite3.SQLITE_CONSTRAINT_FOREIGNKEY:
+            raise InvalidOptionError(f"Unknown vote option: {option_id}") from e
+        raise
+    except Exception:
+        await db.rollback()
+        raise
+    await db.commit()
+    return row is not None
+
 
 async def clear_votes(db_path: str) -> None:
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("DROP TABLE IF EXISTS votes;")
-        await db.execute(
-            """
-            CREATE TABLE votes (
-              user_id INTEGER PRIMARY KEY,
-              option_id INTEGER NOT NULL,
-              created_at TEXT NOT NULL DEFAULT (datetime('now')),
-              FOREIGN KEY(option_id) REFERENCES vote_options(option_id)
-            );
-            """
-        )
+    global _voters_cache, _tally
+    db = await get_conn(db_path)
+    async with _get_write_lock():
+        await db.execute(SQL_DELETE_VOTES)
         await db.commit()
+        _voters_cache = set()
+        _tally = Counter()
 
 
 async def get_vote_standings(db_path: str) -> list[VoteStandingRow]:
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("PRAGMA foreign_keys = ON;")
-        cur = await db.execute(
-            """
-            SELECT
-              o.option_id,
-              o.label,
-              COALESCE(COUNT(v.user_id), 0) AS votes
-            FROM vote_options o
-            LEFT JOIN votes v ON v.option_id = o.option_id
-            GROUP BY o.option_id, o.label
-            ORDER BY o.option_id ASC;
-            """
-        )
-        rows = await cur.fetchall()
-        return [VoteStandingRow(int(r[0]), str(r[1]), int(r[2])) for r in rows]
+    options = await _options(db_path)
+    tally = await _counts(db_path)
+    return [
+        VoteStandingRow(oid, label, tally.get(oid, 0))
+        for oid, label in sorted(options.items())
+    ]
 
 
 async def get_total_votes(db_path: str) -> int:
-    async with aiosqlite.connect(db_path) as db:
-        cur = await db.execute("SELECT COUNT(*) FROM votes;")
-        row = await cur.fetchone()
-        return int(row[0]) if row else 0
+    return sum((await _counts(db_path)).values())
 
 
 async def get_vote_label(db_path: str, option_id: int) -> Optional[str]:
-    async with aiosqlite.connect(db_path) as db:
-        cur = await db.execute(
-            "SELECT label FROM vote_options WHERE option_id = ?;", (option_id,)
-        )
-        row = await cur.fetchone()
-        return str(row[0]) if row else None
+    return (await _options(db_path)).get(option_id)
 
 
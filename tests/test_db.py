@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import db as vote_db
+
+
+class _DbTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp.name, "votes.db")
+        await vote_db.init_db(self.db_path)
+        await vote_db.set_vote_options(self.db_path, ["a", "b", "c"])
+
+    async def asyncTearDown(self) -> None:
+        await vote_db.close_db()
+        self._tmp.cleanup()
+
+    def db_rows(self, sql: str) -> list[tuple]:
+        raw = sqlite3.connect(self.db_path)
+        try:
+            return raw.execute(sql).fetchall()
+        finally:
+            raw.close()
+
+
+class GroupCommitTest(_DbTestCase):
+    async def test_concurrent_votes_share_one_commit(self) -> None:
+        votes = [(1, 1), (2, 2), (3, 2), (2, 3), (4, 3), (5, 1)]
+        with mock.patch.object(
+            vote_db, "_commit_votes", wraps=vote_db._commit_votes
+        ) as commit_votes:
+            results = await asyncio.gather(
+                *(vote_db.cast_vote(self.db_path, u, o) for u, o in votes)
+            )
+
+        # User 2 appears twice in the batch; only the first vote counts.
+        self.assertEqual(results, [True, True, True, False, True, True])
+        self.assertEqual(commit_votes.call_count, 1)
+        self.assertEqual(
+            self.db_rows("SELECT user_id, option_id FROM votes ORDER BY user_id;"),
+            [(1, 1), (2, 2), (3, 2), (4, 3), (5, 1)],
+        )
+        standings = await vote_db.get_vote_standings(self.db_path)
+        counts = dict(
+            self.db_rows("SELECT option_id, COUNT(*) FROM votes GROUP BY option_id;")
+        )
+        self.assertEqual({r.option_id: r.votes for r in standings}, counts)
+        for user_id in (1, 2, 3, 4, 5):
+            self.assertTrue(await vote_db.user_has_voted(self.db_path, user_id))
+        self.assertFalse(await vote_db.cast_vote(self.db_path, 3, 1))
+
+    async def test_options_reset_before_commit(self) -> None:
+        task = asyncio.create_task(vote_db.cast_vote(self.db_path, 1, 3))
+        await asyncio.sleep(0)  # Queued; the writer is still in its window.
+        await vote_db.set_vote_options(self.db_path, ["x", "y"])
+
+        with self.assertRaises(vote_db.InvalidOptionError):
+            await task
+        self.assertEqual(self.db_rows("SELECT * FROM votes;"), [])
+
+    async def test_close_db_flushes_queued_votes(self) -> None:
+        task = asyncio.create_task(vote_db.cast_vote(self.db_path, 1, 2))
+        await asyncio.sleep(0.001)
+        await vote_db.close_db()
+
+        self.assertTrue(task.done())
+        self.assertIs(task.result(), True)
+        self.assertEqual(self.db_rows("SELECT user_id, option_id FROM votes;"), [(1, 2)])
+
+
+class GroupCommitFallbackTest(_DbTestCase):
+    async def test_cancelled_caller_during_row_by_row_retry(self) -> None:
+        # Delete option 3 behind the cache so the batch insert hits the
+        # foreign key and the writer falls back to one insert per vote.
+        raw = sqlite3.connect(self.db_path)
+        raw.execute("DELETE FROM vote_options WHERE option_id = 3;")
+        raw.commit()
+        raw.close()
+
+        tasks: dict[int, asyncio.Task[bool]] = {}
+        insert_vote = vote_db._insert_vote
+
+        async def cancel_user_2(db, user_id, option_id):
+            if user_id == 2:
+                tasks[2].cancel()
+            return await insert_vote(db, user_id, option_id)
+
+        with mock.patch.object(vote_db, "_insert_vote", cancel_user_2):
+            for user_id, option_id in ((1, 3), (2, 1), (3, 2)):
+                tasks[user_id] = asyncio.create_task(
+                    vote_db.cast_vote(self.db_path, user_id, option_id)
+                )
+            results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        self.assertIsInstance(results[0], vote_db.InvalidOptionError)
+        self.assertIsInstance(results[1], asyncio.CancelledError)
+        self.assertIs(results[2], True)
+        self.assertTrue(await vote_db.user_has_voted(self.db_path, 3))
+        # The caches were reloaded, so the deleted option is gone.
+        self.assertEqual(await vote_db.get_options_rendered(self.db_path), "1. a\n2. b")
+        with self.assertRaises(vote_db.InvalidOptionError):
+            await vote_db.cast_vote(self.db_path, 4, 3)
+
+        self.assertEqual(
+            self.db_rows("SELECT user_id, option_id FROM votes ORDER BY user_id;"),
+            [(2, 1), (3, 2)],
+        )
+
+    async def test_vote_already_in_db_but_not_in_cache(self) -> None:
+        raw = sqlite3.connect(self.db_path)
+        raw.execute("INSERT INTO votes(user_id, option_id) VALUES(1, 1);")
+        raw.commit()
+        raw.close()
+
+        results = await asyncio.gather(
+            vote_db.cast_vote(self.db_path, 1, 2),
+            vote_db.cast_vote(self.db_path, 2, 2),
+        )
+
+        self.assertEqual(results, [False, True])
+        standings = await vote_db.get_vote_standings(self.db_path)
+        self.assertEqual([r.votes for r in standings], [1, 1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()